@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import zipfile
+
+from blobs import BlobStore, clone_file, sibling_path
+from download import sha256
+
+BACKUP_MODES = ["zip", "snapshot"]
+
+
+def zip_backup_path(game_install_path: str) -> str:
+    return os.path.join(game_install_path, "backup", "game_backup.zip")
+
+
+def snapshots_path(game_install_path: str) -> str:
+    return sibling_path(game_install_path, ".snapshots")
+
+
+def backup_zip(game_install_path: str) -> None:
+    backup_dir = os.path.join(game_install_path, "backup")
+    tempfile_dir = tempfile.TemporaryDirectory()
+    try:
+        zip_file: zipfile.ZipFile | None = None
+        try:
+            zip_file = zipfile.ZipFile(
+                os.path.join(tempfile_dir.name, "game_backup.zip"), "w"
+            )
+            for foldername, _, filenames in os.walk(game_install_path):
+                for filename in filenames:
+                    file_path = os.path.join(foldername, filename)
+                    relative_path = os.path.relpath(file_path, game_install_path)
+                    zip_file.write(file_path, relative_path)
+        finally:
+            if zip_file is not None:
+                zip_file.close()
+        os.makedirs(backup_dir, exist_ok=True)
+        try:
+            shutil.move(os.path.join(tempfile_dir.name, "game_backup.zip"), backup_dir)
+        except shutil.Error:
+            logging.info("Backup file already exists. Keeping existing backup.")
+    finally:
+        tempfile_dir.cleanup()
+
+
+def restore_zip(game_install_path: str) -> bool:
+    backup_zip_path = zip_backup_path(game_install_path)
+    if not os.path.exists(backup_zip_path):
+        return False
+    with zipfile.ZipFile(backup_zip_path, 'r') as zip_ref:
+        zip_ref.extractall(game_install_path)
+    return True
+
+
+def take_snapshot(game_install_path: str) -> None:
+    """Record the game directory as an index of content-addressed blobs.
+
+    Blobs are read-only clones of the game files named by their sha256, so
+    only files that changed since the previous snapshot take new space. A
+    file whose size and modification time match the previous snapshot is not
+    read again, so snapshotting an unchanged install only costs a stat per
+    file.
+    """
+    root = snapshots_path(game_install_path)
+    blobs = BlobStore(os.path.join(root, "blobs"), read_only=True)
+    index_path = os.path.join(root, "index.json")
+    os.makedirs(root, exist_ok=True)
+
+    index: dict[str, list[int | str]] = {}
+    if os.path.exists(index_path):
+        with open(index_path, "r") as f:
+            index = json.load(f)
+
+    new_index: dict[str, list[int | str]] = {}
+    for foldername, _, filenames in os.walk(game_install_path):
+        for filename in filenames:
+            file_path = os.path.join(foldername, filename)
+            relative_path = os.path.relpath(file_path, game_install_path)
+            st = os.stat(file_path)
+            cached = index.get(relative_path)
+            if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+                digest = str(cached[2])
+            else:
+                digest = sha256(file_path)
+            new_index[relative_path] = [st.st_size, st.st_mtime_ns, blobs.add(file_path, digest)]
+
+    # Blobs are all in place before the index that refers to them is swapped in
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(new_index, f)
+    os.replace(index_path + ".tmp", index_path)
+    blobs.collect({str(entry[2]) for entry in new_index.values()})
+    logging.info(f"Snapshot of {len(new_index)} files taken.")
+
+
+def restore_snapshot(game_install_path: str) -> bool:
+    """Put back every file that differs from the snapshot."""
+    root = snapshots_path(game_install_path)
+    index_path = os.path.join(root, "index.json")
+    if not os.path.exists(index_path):
+        return False
+    with open(index_path, "r") as f:
+        index: dict[str, list[int | str]] = json.load(f)
+
+    blobs = BlobStore(os.path.join(root, "blobs"))
+    restored = 0
+    for relative_path, (size, mtime_ns, digest) in index.items():
+        live = os.path.join(game_install_path, relative_path)
+        if os.path.isfile(live):
+            st = os.stat(live)
+            if st.st_size == size and st.st_mtime_ns == mtime_ns:
+                continue
+        digest = str(digest)
+        os.makedirs(os.path.dirname(live), exist_ok=True)
+        clone_file(blobs.path(digest), live + ".restore")
+        os.chmod(live + ".restore", stat.S_IREAD | stat.S_IWRITE)
+        os.utime(live + ".restore", ns=(int(mtime_ns), int(mtime_ns)))
+        os.replace(live + ".restore", live)
+        restored += 1
+    logging.info(f"Restored {restored} files from snapshot.")
+    return True
+
+
+def backup(game_install_path: str, backup_mode: str | None) -> None:
+    """Back up the game directory with the selected backend."""
+    if backup_mode == "snapshot":
+        take_snapshot(game_install_path)
+    else:
+        backup_zip(game_install_path)
+
+
+def restore_backup(game_install_path: str, backup_mode: str | None) -> bool:
+    """Restore the game directory, returning False if there was no backup."""
+    if backup_mode == "snapshot":
+        return restore_snapshot(game_install_path)
+    return restore_zip(game_install_path)
+
+
+__all__ = [
+    "BACKUP_MODES",
+    "backup",
+    "restore_backup",
+    "take_snapshot",
+    "restore_snapshot",
+    "snapshots_path",
+]
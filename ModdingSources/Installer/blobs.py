@@ -0,0 +1,64 @@
+import os
+import shutil
+import stat
+import sys
+
+from download import sha256
+
+FICLONE = 0x40049409  # Linux ioctl cloning a file's extents (reflink)
+
+
+def sibling_path(install_path: str, suffix: str) -> str:
+    """Directory next to install_path, so renames and hardlinks to it stay on one volume."""
+    return os.path.abspath(install_path).rstrip("\\/") + suffix
+
+
+def clone_file(src: str, dst: str) -> None:
+    """Copy src to dst, sharing its data blocks when the filesystem supports reflinks."""
+    if sys.platform == "linux":
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError:
+                pass
+    shutil.copyfile(src, dst)
+
+
+class BlobStore():
+    """Files named by the sha256 of their content, so each content is stored once."""
+
+    def __init__(self, root: str, read_only: bool = False) -> None:
+        self.root = root
+        self.read_only = read_only
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def add(self, source: str, digest: str | None = None) -> str:
+        """Store a clone of source unless its content is already there, and return its digest."""
+        digest = digest or sha256(source)
+        blob = self.path(digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            clone_file(source, blob + ".tmp")
+            if self.read_only:
+                os.chmod(blob + ".tmp", stat.S_IREAD)
+            os.replace(blob + ".tmp", blob)
+        return digest
+
+    def collect(self, referenced: set[str]) -> None:
+        """Delete the blobs whose digest is not in referenced."""
+        if not os.path.isdir(self.root):
+            return
+        for prefix in os.listdir(self.root):
+            for blob in os.listdir(os.path.join(self.root, prefix)):
+                if blob not in referenced:
+                    path = os.path.join(self.root, prefix, blob)
+                    os.chmod(path, stat.S_IREAD | stat.S_IWRITE)
+                    os.remove(path)
+
+
+__all__ = ["sibling_path", "clone_file", "BlobStore"]
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+from typing import Any
+
+import requests
+import yaml
+
+from options import load_config, save_config
+
+type Url = str
+
+MANIFEST_NAME = "manifest.yaml"
+
+
+def sha256(path: str, chunk_size: int = 1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def download_file(
+    url: Url,
+    dest: str,
+    bandwidth_limit: int | None = None,
+    headers: dict[str, str] | None = None,
+    chunk_size: int = 64 * 1024,
+) -> requests.Response:
+    """Stream url into dest, throttled to bandwidth_limit bytes per second if set.
+
+    Nothing is written when the server answers 304 Not Modified.
+    """
+    response = requests.get(url, stream=True, headers=headers)
+    response.raise_for_status()
+    if response.status_code == 304:
+        return response
+
+    start = time.monotonic()
+    written = 0
+    with open(dest, "wb") as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+            written += len(chunk)
+            if bandwidth_limit:
+                ahead = written / bandwidth_limit - (time.monotonic() - start)
+                if ahead > 0:
+                    time.sleep(ahead)
+    return response
+
+
+def staged_name(url: Url) -> str:
+    """File name of url inside the staging area, unique per url."""
+    digest = hashlib.sha256(url.encode()).hexdigest()[:16]
+    return f"{digest}-{os.path.basename(url)}"
+
+
+def load_manifest(staging_path: str) -> dict[Url, dict[str, Any]]:
+    manifest_path = os.path.join(staging_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    return load_config(manifest_path) or {}
+
+
+def save_manifest(staging_path: str, manifest: dict[Url, dict[str, Any]]) -> None:
+    manifest_path = os.path.join(staging_path, MANIFEST_NAME)
+    # The launcher and the prefetch daemon may both be saving, each needs its own temporary file
+    fd, tmp = tempfile.mkstemp(prefix=MANIFEST_NAME, suffix=".tmp", dir=staging_path)
+    os.close(fd)
+    try:
+        save_config(tmp, manifest)
+        os.replace(tmp, manifest_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _still_current(url: Url, etag: str | None) -> bool:
+    """Whether the server confirms that etag is still the latest version of url."""
+    if not etag:
+        return False
+    try:
+        response = requests.get(url, stream=True, headers={"If-None-Match": etag})
+        response.close()
+    except requests.RequestException as e:
+        logging.warning(f"Could not check {url} for updates ({e}), using the staged copy.")
+        return True
+    return response.status_code == 304
+
+
+def staged_artifact(staging_path: str | None, url: Url) -> str | None:
+    """Return the path of a verified, up to date prefetched copy of url, if there is one.
+
+    A copy older than the prefetch interval it was fetched with is only used
+    once a conditional request confirms it is still the latest.
+    """
+    if staging_path is None:
+        return None
+    manifest = load_manifest(staging_path)
+    entry = manifest.get(url)
+    if entry is None:
+        return None
+    path = os.path.join(staging_path, entry["file"])
+    if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+        logging.warning(f"Staged copy of {url} is missing or incomplete, ignoring it.")
+        return None
+    if time.time() - entry.get("fetched_at", 0) > entry.get("max_age", 0):
+        if not _still_current(url, entry.get("etag")):
+            logging.info(f"Staged copy of {url} is outdated, ignoring it.")
+            return None
+        _mark_fresh(staging_path, url, entry["sha256"])
+    return path
+
+
+def _mark_fresh(staging_path: str, url: Url, digest: str) -> None:
+    """Record that the staged copy of url was just revalidated, on a best-effort basis.
+
+    The manifest is reloaded first so a newer entry written meanwhile by the
+    prefetch daemon is kept, and failing to save only costs another
+    revalidation next time.
+    """
+    try:
+        manifest = load_manifest(staging_path)
+        entry = manifest.get(url)
+        if entry is None or entry["sha256"] != digest:
+            return
+        entry["fetched_at"] = time.time()
+        save_manifest(staging_path, manifest)
+    except (OSError, yaml.YAMLError) as e:
+        logging.warning(f"Could not update the staging manifest: {e}")
+
+
+def fetch_artifact(url: Url, dest: str, staging_path: str | None = None) -> None:
+    """Put url at dest, copying the prefetched copy instead of downloading when there is one."""
+    staged = staged_artifact(staging_path, url)
+    if staged is not None:
+        logging.info(f"Using prefetched {url}")
+        shutil.copyfile(staged, dest)
+    else:
+        download_file(url, dest)
+
+
+__all__ = [
+    "sha256",
+    "download_file",
+    "staged_name",
+    "load_manifest",
+    "save_manifest",
+    "staged_artifact",
+    "fetch_artifact",
+]
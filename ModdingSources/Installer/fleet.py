@@ -0,0 +1,177 @@
+import copy
+import logging
+import os
+import shutil
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from backup import backup
+from constants import GAME_DOWNLOAD_URL, MOD_LOADER_DOWNLOAD_URL
+from download import Url, staged_artifact, staged_name
+from mods import AVAILABLE_MODS
+from options import Options, load_config, save_config
+from prefetch import staging_dir, stage_urls
+from release import detect_file_format, open_decompressed, release_members, unpack_tar
+from transaction import InstallTransaction
+
+
+def load_fleet(options: Options) -> list[Options]:
+    """Read the fleet file into one Options per game installation.
+
+    Each entry of the file's ``installs`` list needs a ``game_install_path`` and
+    may override any other option, such as ``mod_list``.
+    """
+    assert options.fleet is not None, "Fleet file must be set."
+    fleet = load_config(options.fleet) or {}
+    installs: list[Options] = []
+    for entry in fleet.get("installs", []):
+        install = copy.copy(options)
+        install.mod_list = []
+        for key, value in entry.items():
+            if hasattr(install, key):
+                setattr(install, key, value)
+            else:
+                logging.warning(f"Unknown fleet option '{key}' ignored.")
+        assert install.game_install_path is not None, "Every fleet install needs a game_install_path."
+        if install.game_install_path.endswith(".exe"):
+            install.game_install_path = os.path.dirname(install.game_install_path)
+        install.game_install_path = os.path.abspath(install.game_install_path)
+        installs.append(install)
+    return installs
+
+
+def extract_shared(archive_path: str, dest: str) -> None:
+    """Extract a release archive once, so every install can link to the same files."""
+    marker = os.path.join(dest, ".extracted")
+    if os.path.exists(marker) and os.path.getmtime(marker) >= os.path.getmtime(archive_path):
+        return
+    shutil.rmtree(dest, ignore_errors=True)
+    os.makedirs(dest)
+    archive_format = detect_file_format(archive_path)
+    if archive_format != "zip":
+        with open(archive_path, "rb") as f:
+            unpack_tar(open_decompressed(f, archive_format), dest)
+    else:
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            for member, relative_path in release_members(zip_ref):
+                path = os.path.join(dest, relative_path)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with zip_ref.open(member) as src, open(path, 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+    open(marker, "w").close()
+
+
+def update_install(install: Options, shared: dict[Url, str], failures: dict[Url, str]) -> dict[str, Any]:
+    """Bring one installation up to date from the shared artifacts and summarize it.
+
+    An install updated from an older staged copy of an artifact that could
+    not be fetched this run is reported as stale rather than ok.
+    """
+    assert install.game_install_path is not None, "Game install path must be set."
+    start = time.monotonic()
+    summary: dict[str, Any] = {
+        "game_install_path": install.game_install_path,
+        "mod_list": install.mod_list,
+    }
+
+    stale: dict[Url, str] = {}
+
+    def artifact(url: Url) -> str:
+        if url not in shared:
+            raise RuntimeError(f"Could not download {url}: {failures.get(url, 'no staged copy')}")
+        if url in failures:
+            stale[url] = failures[url]
+        return shared[url]
+
+    transaction = InstallTransaction(install.game_install_path)
+    try:
+        if install.backup_before_install:
+            backup(install.game_install_path, install.backup_mode)
+
+        trees = []
+        if install.auto_update_game:
+            trees.append(artifact(GAME_DOWNLOAD_URL))
+        if install.auto_update_game or install.auto_update_installer:
+            trees.append(artifact(MOD_LOADER_DOWNLOAD_URL))
+        for tree in trees:
+            for foldername, _, filenames in os.walk(tree):
+                for filename in filenames:
+                    if filename == ".extracted":
+                        continue
+                    source = os.path.join(foldername, filename)
+                    transaction.stage_file(source, os.path.relpath(source, tree))
+
+        for mod_name in install.mod_list:
+            if mod_name in AVAILABLE_MODS:
+                transaction.stage_file(
+                    artifact(AVAILABLE_MODS[mod_name]), os.path.join("Mods", f"{mod_name}.dll")
+                )
+            else:
+                logging.warning(f"Mod '{mod_name}' not found in available mods.")
+        mods_dir = os.path.join(install.game_install_path, "Mods")
+        if os.path.isdir(mods_dir):
+            for existing_mod in os.listdir(mods_dir):
+                mod_name, ext = os.path.splitext(existing_mod)
+                if ext == ".dll" and mod_name not in install.mod_list and mod_name in AVAILABLE_MODS:
+                    transaction.stage_removal(os.path.join("Mods", existing_mod))
+
+        transaction.commit()
+        summary["status"] = "stale" if stale else "ok"
+        if stale:
+            summary["stale_artifacts"] = stale
+        summary["updated_files"] = len(transaction.files)
+        summary["removed_files"] = len(transaction.removals)
+    except Exception as e:
+        logging.error(f"Failed to update {install.game_install_path}: {e}")
+        transaction.discard()
+        summary["status"] = "failed"
+        summary["error"] = str(e)
+    summary["duration"] = round(time.monotonic() - start, 3)
+    return summary
+
+
+def run_fleet(options: Options) -> list[dict[str, Any]]:
+    """Update every installation of the fleet file in parallel, downloading each artifact once."""
+    installs = load_fleet(options)
+    staging_path = staging_dir(options)
+
+    urls: list[Url] = []
+    for install in installs:
+        if install.auto_update_game:
+            urls.append(GAME_DOWNLOAD_URL)
+        if install.auto_update_game or install.auto_update_installer:
+            urls.append(MOD_LOADER_DOWNLOAD_URL)
+        urls += [AVAILABLE_MODS[mod] for mod in install.mod_list if mod in AVAILABLE_MODS]
+    urls = list(dict.fromkeys(urls))
+    logging.info(f"Fleet of {len(installs)} installs needs {len(urls)} artifacts.")
+    failures = stage_urls(staging_path, urls)
+
+    shared: dict[Url, str] = {}
+    for url in urls:
+        path = staged_artifact(staging_path, url)
+        if path is None:
+            continue  # Installs needing it will report the failure
+        if url in (GAME_DOWNLOAD_URL, MOD_LOADER_DOWNLOAD_URL):
+            tree = os.path.join(staging_path, "extracted", staged_name(url))
+            extract_shared(path, tree)
+            path = tree
+        shared[url] = path
+
+    with ThreadPoolExecutor(max_workers=min(8, len(installs) or 1)) as executor:
+        report = list(executor.map(lambda install: update_install(install, shared, failures), installs))
+
+    report_path = options.fleet_report or os.path.join(
+        os.path.dirname(os.path.abspath(options.fleet or "")), "fleet_report.yaml"
+    )
+    save_config(report_path, {"installs": report})
+    for summary in report:
+        logging.info(
+            f"{summary['game_install_path']}: {summary['status']} in {summary['duration']}s"
+        )
+    logging.info(f"Fleet report written to {report_path}")
+    return report
+
+
+__all__ = ["load_fleet", "update_install", "run_fleet"]
@@ -1,21 +1,115 @@
 import logging
 import os
+import re
 import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+
+from telemetry import ResourceSampler
+
+LOG_FILE = "logs.txt"  # Written next to the game by the mod loader
+
+type LogEvent = tuple[str, str]  # (kind, detail), kind is "loaded", "mod_loaded" or "mod_failed"
+
+_LOG_EVENTS: list[tuple[str, re.Pattern[str]]] = [
+    ("loaded", re.compile(r"\[ToppleBitModding\] Loaded successfully!()")),
+    ("mod_loaded", re.compile(r"\[ToppleBitModding\] Loaded mod: (.+)")),
+    ("mod_failed", re.compile(r"\[ToppleBitModding\] Failed to load mod (.+)")),
+]
+
+
+def parse_log_line(line: str) -> LogEvent | None:
+    """Turn a mod loader log line into an event, if it reports on mod loading."""
+    for kind, pattern in _LOG_EVENTS:
+        match = pattern.search(line)
+        if match:
+            return kind, match.group(1)
+    return None
+
+
+def _rotation_key(path: str) -> tuple[int, int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns, st.st_ctime_ns
+
+
+class LogFollower():
+    """Incrementally read the lines appended to a log file.
+
+    Only bytes past the last read offset are read. The loader copies the log
+    to logs.txt.old and recreates it on every start, and rewrites the whole
+    file on every line. The recreated file may get the old inode back, so any
+    change to logs.txt.old also restarts from the beginning, as does a new
+    inode, or a file shorter than the offset that is still short on the next
+    poll.
+    """
+
+    def __init__(self, path: str, from_end: bool = True) -> None:
+        self.path = path
+        self.offset = 0
+        self.identity: int | None = None
+        self.rotation = _rotation_key(path + ".old")
+        self.partial = b""
+        self.shrunk = False
+        if from_end and os.path.exists(path):
+            st = os.stat(path)
+            self.identity, self.offset = st.st_ino, st.st_size
+
+    def read_lines(self) -> list[str]:
+        rotation = _rotation_key(self.path + ".old")
+        if rotation != self.rotation:
+            self.rotation, self.identity = rotation, None
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        if st.st_ino != self.identity:
+            self.identity, self.offset, self.partial = st.st_ino, 0, b""
+        elif st.st_size < self.offset:
+            if not self.shrunk:
+                # Might be caught mid-rewrite, look again next poll
+                self.shrunk = True
+                return []
+            self.offset, self.partial = 0, b""
+        self.shrunk = False
+        if st.st_size == self.offset:
+            return []
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        self.offset += len(data)
+        *lines, self.partial = (self.partial + data).split(b"\n")
+        return [line.decode("utf-8", errors="replace").rstrip("\r") for line in lines]
 
 
 class Game():
     def __init__(self, exe_path: str) -> None:
         self.exe_path = exe_path
         self.process: subprocess.Popen[bytes] | None = None
+        self.log_follower: LogFollower | None = None
+        self.log_thread: threading.Thread | None = None
+        self.telemetry_thread: threading.Thread | None = None
+        self.started_at: float | None = None
+        self.loaded_at: float | None = None  # When the loader reported "Loaded successfully"
 
     def run(self, force: bool = False) -> None:
         """Run the game."""
         if self.process is not None and not force:
             logging.error("Game is already running.")
             return
+        # Skip what previous sessions logged before the loader rotates the file
+        self.log_follower = LogFollower(
+            os.path.join(os.path.dirname(self.exe_path), LOG_FILE)
+        )
+        self.started_at, self.loaded_at = time.monotonic(), None
         self.process = subprocess.Popen(
             self.exe_path,
-            creationflags=subprocess.CREATE_NO_WINDOW,
+            creationflags=subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0,
             cwd=os.path.dirname(self.exe_path)
         )
         logging.info(f"Game started with PID {self.process.pid}.")
@@ -47,6 +141,72 @@ class Game():
         """Wait for the game process to finish."""
         if self.process is not None:
             self.process.wait()
+        if self.log_thread is not None:
+            self.log_thread.join()
+        if self.telemetry_thread is not None:
+            self.telemetry_thread.join()
+
+    def follow_logs(
+        self, on_event: Callable[[LogEvent], None] | None = None, interval: float = 0.5
+    ) -> None:
+        """Tail the game's logs.txt in the background while the game runs.
+
+        Mod load events go to the installer log and to on_event, which is
+        called from the background thread.
+        """
+        if self.log_follower is None:
+            return
+        follower = self.log_follower
+
+        def follow() -> None:
+            # Stop once the game exits or is relaunched with a new follower
+            while follower is self.log_follower:
+                running = self.is_running()
+                for line in follower.read_lines():
+                    event = parse_log_line(line)
+                    if event is None:
+                        continue
+                    if event[0] == "loaded":
+                        self.loaded_at = time.monotonic()
+                    if event[0] == "mod_failed":
+                        logging.error(f"Game log: {line}")
+                    else:
+                        logging.info(f"Game log: {line}")
+                    if on_event is not None:
+                        on_event(event)
+                if not running:
+                    return
+                time.sleep(interval)
+
+        self.log_thread = threading.Thread(target=follow, daemon=True)
+        self.log_thread.start()
+
+    def start_telemetry(self, interval: float, summary_dir: str) -> None:
+        """Sample the game's resource usage every interval seconds while it runs.
+
+        A summary of the session, including the time the mod loader took to
+        report success, is written to summary_dir when the game exits. The
+        mod loading latency needs follow_logs to be running.
+        """
+        if self.process is None or self.started_at is None:
+            return
+        process, started_at = self.process, self.started_at
+        sampler = ResourceSampler(process.pid, started_at)
+        mods_dir = os.path.join(os.path.dirname(self.exe_path), "Mods")
+        mods = sorted(f for f in os.listdir(mods_dir) if f.endswith(".dll")) if os.path.isdir(mods_dir) else []
+        path = os.path.join(summary_dir, time.strftime("session-%Y%m%d-%H%M%S.yaml"))
+
+        def sample() -> None:
+            while process.poll() is None:
+                sampler.sample()
+                time.sleep(interval)
+            latency = None
+            if self.loaded_at is not None and self.started_at == started_at:
+                latency = round(self.loaded_at - started_at, 3)
+            sampler.export(path, latency, mods)
+
+        self.telemetry_thread = threading.Thread(target=sample, daemon=True)
+        self.telemetry_thread.start()
 
     def __enter__(self) -> "Game":
         return self
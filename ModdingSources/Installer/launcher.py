@@ -1,26 +1,39 @@
+import queue
 import shutil
 import subprocess
-import hashlib
 import sys
 import tempfile
 import time
-from typing import cast, Callable
-import requests
 from mods import AVAILABLE_MODS, update_mods
 import game
+from backup import backup, restore_backup
+from logs import stage
+from download import Url, fetch_artifact, sha256
 from options import Options, save_options
+from profiles import switch_profile
+from prefetch import staging_dir
+from release import open_decompressed, open_release
+from transaction import InstallTransaction
 from constants import INSTALLER_DOWNLOAD_URL, GAME_DOWNLOAD_URL, MOD_LOADER_DOWNLOAD_URL, UPDATER_DOWNLOAD_URL
 import os
-import zipfile
 import logging
 
 
-def sha256(path: str, chunk_size: int = 1024 * 1024):
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(chunk_size), b""):
-            h.update(chunk)
-    return h.hexdigest()
+def stage_release(transaction: InstallTransaction, url: Url, directory: str, staging_path: str | None) -> None:
+    """Stage the files of a release, unpacking tar releases while they download."""
+    stream, archive_format = open_release(url, staging_path)
+    with stream:
+        if archive_format != "zip":
+            logging.info(f"Unpacking {archive_format} release {url}")
+            transaction.stage_tar(open_decompressed(stream, archive_format))
+            return
+        # A zip's directory is at its end, so it has to be complete on disk first
+        path = getattr(stream, "name", None)
+        if not isinstance(path, str):
+            path = os.path.join(directory, os.path.basename(url))
+            with open(path, "wb") as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+    transaction.stage_zip(path)
 
 
 def launcher(options: Options):
@@ -31,34 +44,30 @@ def launcher(options: Options):
     assert options.setting_save_path is not None, "Setting save path must be set."
     assert options.mod_list is not None, "Mod list must be set."
     options.game_install_path = os.path.abspath(options.game_install_path)
+    staging_path = staging_dir(options)
+    transaction = InstallTransaction(options.game_install_path)
 
     try:
         if options.auto_update_installer:
             logging.info("Auto-updating installer...")
 
-            response = requests.get(UPDATER_DOWNLOAD_URL)
-            response.raise_for_status()
             updater = os.path.join(options.installer_install_path, "update.exe")
-            if os.path.exists(updater):
-                while os.path.exists(updater):
-                    try:
-                        os.remove(updater)
-                    except PermissionError:
-                        logging.info("Waiting for existing updater to close...")
-                        time.sleep(1)
-            with open(updater, "wb") as f:
-                f.write(response.content)
-
-            response = requests.get(INSTALLER_DOWNLOAD_URL)
-            response.raise_for_status()
-
-            old = os.path.join(options.installer_install_path, "ToppleBitModdingLauncher.exe")
-            new = os.path.join(options.installer_install_path, "ToppleBitModdingLauncher.new.exe")
-
-            if os.path.exists(new):
-                os.remove(new)
-            with open(new, "wb") as f:
-                f.write(response.content)
+            with stage("installer_download"):
+                if os.path.exists(updater):
+                    while os.path.exists(updater):
+                        try:
+                            os.remove(updater)
+                        except PermissionError:
+                            logging.info("Waiting for existing updater to close...")
+                            time.sleep(1)
+                fetch_artifact(UPDATER_DOWNLOAD_URL, updater, staging_path)
+
+                old = os.path.join(options.installer_install_path, "ToppleBitModdingLauncher.exe")
+                new = os.path.join(options.installer_install_path, "ToppleBitModdingLauncher.new.exe")
+
+                if os.path.exists(new):
+                    os.remove(new)
+                fetch_artifact(INSTALLER_DOWNLOAD_URL, new, staging_path)
 
             needs_update = os.path.getsize(old) != os.path.getsize(new) or sha256(old) != sha256(new)
 
@@ -82,128 +91,73 @@ def launcher(options: Options):
 
         if options.backup_before_install:
             logging.info("Backing up game files...")
-            backup_dir = os.path.join(
-                options.game_install_path, "backup"
-            )
-            tempfile_dir = tempfile.TemporaryDirectory()
-            try:
-                zip_file: zipfile.ZipFile | None = None
-                try:
-                    zip_file = zipfile.ZipFile(
-                        os.path.join(tempfile_dir.name, "game_backup.zip"), "w"
-                    )
-                    for foldername, _, filenames in os.walk(options.game_install_path):
-                        for filename in filenames:
-                            file_path = os.path.join(foldername, filename)
-                            relative_path = os.path.relpath(
-                                file_path, options.game_install_path
-                            )
-                            zip_file.write(file_path, relative_path)
-                finally:
-                    if zip_file is not None:
-                        zip_file.close()
-                os.makedirs(backup_dir, exist_ok=True)
-                try:
-                    shutil.move(
-                        os.path.join(tempfile_dir.name, "game_backup.zip"), backup_dir
-                    )
-                except shutil.Error:
-                    logging.info("Backup file already exists. Keeping existing backup.")
-            finally:
-                tempfile_dir.cleanup()
+            with stage("backup"):
+                backup(options.game_install_path, options.backup_mode)
 
         if options.auto_update_game:
             logging.info("Auto-updating game...")
-            response = requests.get(GAME_DOWNLOAD_URL, stream=True)
-            response.raise_for_status()
             tempfile_dir = tempfile.TemporaryDirectory()
-            game_zip_path = os.path.join(
-                tempfile_dir.name, "LatestGameBuild.zip"
-            )
-
             try:
-                with open(game_zip_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                with zipfile.ZipFile(game_zip_path, 'r') as zip_ref:
-                    members = [m for m in zip_ref.namelist() if not m.endswith('/')]
-                    split_paths = [m.split('/') for m in members]
-                    top_levels = {p[0] for p in split_paths}
-
-                    # If there's a single top-level directory, then it's double-wrapped
-                    if len(top_levels) == 1:
-                        for m, parts in zip(members, split_paths):
-                            relative_path = os.path.join(*parts[1:])
-                            dest = os.path.join(options.game_install_path, relative_path)
-
-                            os.makedirs(os.path.dirname(dest), exist_ok=True)
-                            with zip_ref.open(m) as src, open(dest, 'wb') as dst:
-                                dst.write(src.read())
-                    else:
-                        zip_ref.extractall(options.game_install_path)
+                with stage("game_update"):
+                    stage_release(transaction, GAME_DOWNLOAD_URL, tempfile_dir.name, staging_path)
             finally:
                 tempfile_dir.cleanup()
 
         if options.auto_update_game or options.auto_update_installer:
             # Now we update the mod loader
-            response = requests.get(MOD_LOADER_DOWNLOAD_URL, stream=True)
-            response.raise_for_status()
             tempfile_dir = tempfile.TemporaryDirectory()
-            mod_loader_zip_path = os.path.join(
-                tempfile_dir.name, "LatestModLoaderBuild.zip"
-            )
-
             try:
-                with open(mod_loader_zip_path, "wb") as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                with zipfile.ZipFile(mod_loader_zip_path, 'r') as zip_ref:
-                    members = [m for m in zip_ref.namelist() if not m.endswith('/')]
-                    split_paths = [m.split('/') for m in members]
-                    top_levels = {p[0] for p in split_paths}
-
-                    # If there's a single top-level directory, then it's double-wrapped
-                    if len(top_levels) == 1:
-                        for m, parts in zip(members, split_paths):
-                            relative_path = os.path.join(*parts[1:])
-                            dest = os.path.join(options.game_install_path, relative_path)
-
-                            os.makedirs(os.path.dirname(dest), exist_ok=True)
-                            with zip_ref.open(m) as src, open(dest, 'wb') as dst:
-                                dst.write(src.read())
-                    else:
-                        zip_ref.extractall(options.game_install_path)
+                with stage("mod_loader_update"):
+                    stage_release(transaction, MOD_LOADER_DOWNLOAD_URL, tempfile_dir.name, staging_path)
             finally:
                 tempfile_dir.cleanup()
 
+        # Live files only change here, in one short batch of renames
+        with stage("commit"):
+            transaction.commit()
+
     except Exception as e:
         logging.error(f"An error occurred: {e}")
-        if options.restore_backup_on_failure:
+        transaction.discard()
+        # A failed commit rolls itself back, so the backup is only needed if that failed too
+        if options.restore_backup_on_failure and transaction.dirty:
             logging.info("Restoring from backup...")
-            backup_zip_path = os.path.join(
-                options.game_install_path, "backup", "game_backup.zip"
-            )
-            if os.path.exists(backup_zip_path):
-                with zipfile.ZipFile(backup_zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(options.game_install_path)
+            if restore_backup(options.game_install_path, options.backup_mode):
                 logging.info("Restoration complete.")
             else:
                 logging.info("No backup found to restore.")
         raise
 
+    if options.active_profile:
+        if options.mod_profiles is None:
+            options.mod_profiles = {}
+        if options.active_profile not in options.mod_profiles:
+            logging.info(f"Creating mod profile '{options.active_profile}'.")
+            options.mod_profiles[options.active_profile] = list(options.mod_list)
+            save_options(options)
+        options.mod_list = options.mod_profiles[options.active_profile]
+
     logging.info("Launching launcher with options:")
     logging.info(f"Game install path: {options.game_install_path}")
     logging.info(f"Mod list: {options.mod_list}")
 
+    telemetry_path = os.path.join(options.installer_install_path, "telemetry")
+
     with game.Game(os.path.join(options.game_install_path, "ToppleBit.exe")) as gameProcess:
 
-        global tk, messagebox
+        global tk, messagebox, ttk, ModPicker
         if options.no_window:
             logging.info("Running launcher in no-window mode.")
+            if options.active_profile:
+                switch_profile(options.game_install_path, options.active_profile, options.mod_list, staging_path)
             gameProcess.run()
+            gameProcess.follow_logs()
+            if options.telemetry_interval:
+                gameProcess.start_telemetry(options.telemetry_interval, telemetry_path)
         else:
             import tkinter as tk
-            from tkinter import messagebox
+            from tkinter import messagebox, ttk
+            from mod_picker import ModPicker
 
             logging.info("Running launcher with GUI.")
             root = tk.Tk()
@@ -218,38 +172,60 @@ def launcher(options: Options):
             tk.Label(frame, text=f"Game Path: {options.game_install_path}").pack(anchor=tk.W, pady=5)
             tk.Label(frame, text=f"Mods: {', '.join(options.mod_list)}").pack(anchor=tk.W, pady=5)
 
+            # Mod profile
+            profile_frame = tk.Frame(frame)
+            profile_frame.pack(anchor=tk.W, pady=(0, 5), fill=tk.X)
+            tk.Label(profile_frame, text="Mod profile (empty for none):").pack(side=tk.LEFT)
+            profile_box = ttk.Combobox(profile_frame, values=sorted(options.mod_profiles or {}))
+            profile_box.pack(side=tk.LEFT, padx=(5, 0), expand=True, fill=tk.X)
+            if options.active_profile:
+                profile_box.set(options.active_profile)
+
             # Mod list
-            mod_list_frame = tk.Frame(frame)
-            mod_list_frame.pack(anchor=tk.W, pady=(0, 10), expand=True, fill=tk.X)
-            tk.Label(mod_list_frame, text="Mods to Install (comma-separated):").pack(
-                anchor=tk.W
-            )
-            mod_list_scrollbar = tk.Scrollbar(mod_list_frame, orient=tk.VERTICAL)
-            mod_list_box = tk.Listbox(
-                mod_list_frame,
-                selectmode=tk.MULTIPLE,
-                yscrollcommand=mod_list_scrollbar.set,
-                height=min(5, len(AVAILABLE_MODS)),
-            )
-            mod_list_scrollbar.config(command=mod_list_box.yview)
-            mod_list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-            mod_list_box.pack(anchor=tk.W, pady=(0, 10), fill=tk.X)
-            for mod in AVAILABLE_MODS.keys():
-                mod_list_box.insert(tk.END, mod)
-                if mod in options.mod_list:
-                    mod_list_box.selection_set(tk.END)
+            mod_picker = ModPicker(frame, list(AVAILABLE_MODS.keys()), options.mod_list)
+            mod_picker.pack(anchor=tk.W, pady=(0, 10), expand=True, fill=tk.X)
+
+            def on_profile_selected(_=None):
+                mod_picker.set_selected((options.mod_profiles or {}).get(profile_box.get(), []))
+
+            profile_box.bind("<<ComboboxSelected>>", on_profile_selected)
 
             button_frame = tk.Frame(frame)
             button_frame.pack(pady=20)
 
+            # Live mod loading status, fed by the game's log follower thread
+            log_events: queue.Queue[game.LogEvent] = queue.Queue()
+            log_box = tk.Listbox(frame, height=5)
+            log_box.pack(anchor=tk.W, fill=tk.X)
+
+            def poll_log_events():
+                while not log_events.empty():
+                    kind, detail = log_events.get_nowait()
+                    if kind == "loaded":
+                        log_box.insert(tk.END, "Mod loader ready.")
+                    elif kind == "mod_loaded":
+                        log_box.insert(tk.END, f"Loaded {detail}")
+                    else:
+                        log_box.insert(tk.END, f"FAILED {detail}")
+                        log_box.itemconfig(tk.END, foreground="red")
+                    log_box.see(tk.END)
+                root.after(250, poll_log_events)
+
             def on_launch():
                 assert options.game_install_path is not None, "Game install path must be set."
-                options.mod_list = [
-                    mod_list_box.get(i)
-                    for i in cast(Callable[[], list[int]], mod_list_box.curselection)()
-                ]
+                options.mod_list = mod_picker.get_selected()
+                options.active_profile = profile_box.get().strip() or None
+                if options.active_profile:
+                    if options.mod_profiles is None:
+                        options.mod_profiles = {}
+                    options.mod_profiles[options.active_profile] = options.mod_list
                 save_options(options)
-                update_mods(options.mod_list, options.game_install_path)
+                with stage("update_mods"):
+                    if options.active_profile:
+                        switch_profile(options.game_install_path, options.active_profile, options.mod_list, staging_path)
+                    else:
+                        switch_profile(options.game_install_path, None)
+                        update_mods(options.mod_list, options.game_install_path, staging_path)
                 if gameProcess.is_running():
                     ret = messagebox.askyesnocancel(
                         "Warning",
@@ -264,10 +240,14 @@ def launcher(options: Options):
                         gameProcess.run(force=True)
                 else:
                     gameProcess.run()
-                root.destroy()
+                log_box.delete(0, tk.END)
+                gameProcess.follow_logs(log_events.put)
+                if options.telemetry_interval:
+                    gameProcess.start_telemetry(options.telemetry_interval, telemetry_path)
 
             tk.Button(button_frame, text="Launch Game", command=on_launch, width=15).pack(side=tk.LEFT, padx=5)
             tk.Button(button_frame, text="Exit", command=root.destroy, width=15).pack(side=tk.LEFT, padx=5)
+            poll_log_events()
 
             tk.mainloop()
 
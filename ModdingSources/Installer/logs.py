@@ -0,0 +1,104 @@
+import atexit
+import contextlib
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import time
+from typing import Iterator
+
+LOG_FORMAT = "[%(asctime)s][%(levelname)s] %(message)s"
+DEFAULT_LOG_MAX_BYTES = 5 * 1024 * 1024  # Size at which the log file is rotated
+DEFAULT_LOG_BACKUP_COUNT = 5  # Compressed old segments kept next to the log
+
+# Attributes every LogRecord has, anything else was passed through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed with extra=."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    with open(source, "rb") as src, gzip.open(dest, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+def setup_logging(
+    path: str,
+    json_lines: bool = False,
+    max_bytes: int = DEFAULT_LOG_MAX_BYTES,
+    backup_count: int = DEFAULT_LOG_BACKUP_COUNT,
+) -> None:
+    """Send every log record through a queue to a rotating, compressing file handler.
+
+    Logging calls only enqueue the record, the file is written, rotated and
+    gzipped by a background listener thread. Calling it again replaces the
+    previous configuration.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    file_handler.namer = lambda name: name + ".gz"
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(logging.INFO)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+atexit.register(_stop_listener)
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Log how long the enclosed block took, as stage and duration fields in JSON logs."""
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        yield
+        status = "ok"
+    finally:
+        duration = round(time.perf_counter() - start, 3)
+        logging.info(
+            f"Stage {name} {status} in {duration}s",
+            extra={"stage": name, "duration": duration, "status": status},
+        )
+
+
+__all__ = ["JsonLinesFormatter", "setup_logging", "stage"]
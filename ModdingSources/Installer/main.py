@@ -1,32 +1,38 @@
 import os
 import shutil
 import sys
-from typing import Any, Callable, cast
+from typing import Any
 import requests
 from options import load_config, parse_options, save_options
 from launcher import launcher
+from prefetch import run_prefetch
+from fleet import run_fleet
+from verify import verify_install
 from platformdirs import user_config_dir
 from mods import AVAILABLE_MODS
+from backup import BACKUP_MODES
 from constants import INSTALLER_DOWNLOAD_URL
 import logging
-
-
-logging.basicConfig(
-    level=logging.INFO,
-    format="[%(asctime)s][%(levelname)s] %(message)s",
-    filename=os.path.join(user_config_dir("ToppleBitModding", ensure_exists=True), "installer.log"),
-)
+from logs import setup_logging
 
 
 def main():
     options = parse_options()
+    # The prefetch daemon runs alongside the launcher, keep it from rotating the same file
+    log_path = os.path.join(
+        user_config_dir("ToppleBitModding", ensure_exists=True),
+        "prefetch.log" if options.prefetch else "installer.log",
+    )
+    setup_logging(log_path, json_lines=options.json_logs)
+    json_logs = options.json_logs
     logging.info("Parsed options: %s", vars(options))
-    global tk, messagebox, filedialog
+    global tk, messagebox, filedialog, ModPicker
     if options.no_window:
         logging.info("Running installer in no-window mode.")
     else:
         import tkinter as tk
         from tkinter import messagebox, filedialog
+        from mod_picker import ModPicker
 
         logging.info("Running installer with GUI.")
 
@@ -55,6 +61,8 @@ def main():
                     or getattr(options, key) is False
                 ):
                     setattr(options, key, value)
+            if options.json_logs and not json_logs:
+                setup_logging(log_path, json_lines=True)
 
     if any([mod not in AVAILABLE_MODS for mod in options.mod_list]):
         if not options.no_window:
@@ -64,6 +72,31 @@ def main():
         logging.error("Error: One or more specified mods are not available.")
         sys.exit(1)
 
+    if options.fleet:
+        logging.info("Running installer in fleet mode.")
+        if not options.installer_install_path:
+            options.installer_install_path = user_config_dir(
+                "ToppleBitModding", ensure_exists=True
+            )
+        report = run_fleet(options)
+        sys.exit(0 if all(summary["status"] == "ok" for summary in report) else 1)
+
+    if options.verify:
+        if not already_installed or not options.game_install_path:
+            logging.error("Error: Verify mode requires a completed installation.")
+            sys.exit(1)
+        logging.info("Running installer in verify mode.")
+        verify_install(options)
+        return
+
+    if options.prefetch:
+        if not already_installed:
+            logging.error("Error: Prefetch mode requires a completed installation.")
+            sys.exit(1)
+        logging.info("Running installer in prefetch mode.")
+        run_prefetch(options)
+        return
+
     if already_installed:
         logging.info("Installer already installed or settings file found. Skipping setup.")
         launcher(options)
@@ -178,25 +211,8 @@ def main():
         game_path_button.pack(side=tk.LEFT, padx=(5, 0))
 
         # Mod list
-        mod_list_frame = tk.Frame(frame)
-        mod_list_frame.pack(anchor=tk.W, pady=(0, 10), expand=True, fill=tk.X)
-        tk.Label(mod_list_frame, text="Mods to Install (comma-separated):").pack(
-            anchor=tk.W
-        )
-        mod_list_scrollbar = tk.Scrollbar(mod_list_frame, orient=tk.VERTICAL)
-        mod_list_box = tk.Listbox(
-            mod_list_frame,
-            selectmode=tk.MULTIPLE,
-            yscrollcommand=mod_list_scrollbar.set,
-            height=min(5, len(AVAILABLE_MODS)),
-        )
-        mod_list_scrollbar.config(command=mod_list_box.yview)
-        mod_list_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        mod_list_box.pack(anchor=tk.W, pady=(0, 10), fill=tk.X)
-        for mod in AVAILABLE_MODS.keys():
-            mod_list_box.insert(tk.END, mod)
-            if mod in options.mod_list:
-                mod_list_box.selection_set(tk.END)
+        mod_picker = ModPicker(frame, list(AVAILABLE_MODS.keys()), options.mod_list)
+        mod_picker.pack(anchor=tk.W, pady=(0, 10), expand=True, fill=tk.X)
 
         # Checkboxes
         backup_var = tk.BooleanVar(value=options.backup_before_install)
@@ -204,6 +220,14 @@ def main():
             frame, text="Backup before installing mods", variable=backup_var
         ).pack(anchor=tk.W)
 
+        backup_mode_frame = tk.Frame(frame)
+        backup_mode_frame.pack(anchor=tk.W)
+        tk.Label(backup_mode_frame, text="Backup mode:").pack(side=tk.LEFT)
+        backup_mode_var = tk.StringVar(value=options.backup_mode or "zip")
+        tk.OptionMenu(backup_mode_frame, backup_mode_var, *BACKUP_MODES).pack(
+            side=tk.LEFT
+        )
+
         restore_backup_var = tk.BooleanVar(value=options.restore_backup_on_failure)
         tk.Checkbutton(
             frame, text="Restore backup on failure", variable=restore_backup_var
@@ -258,11 +282,9 @@ def main():
             options.installer_install_path = installer_path_entry.get()
             options.setting_save_path = settings_path_entry.get()
             options.game_install_path = game_path_entry.get()
-            options.mod_list = [
-                mod_list_box.get(i)
-                for i in cast(Callable[[], list[int]], mod_list_box.curselection)()
-            ]
+            options.mod_list = mod_picker.get_selected()
             options.backup_before_install = backup_var.get()
+            options.backup_mode = backup_mode_var.get()
             options.restore_backup_on_failure = restore_backup_var.get()
             options.start_on_startup = start_on_startup_var.get()
             options.auto_run = auto_run_var.get()
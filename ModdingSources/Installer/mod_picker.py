@@ -0,0 +1,133 @@
+import sys
+import tkinter as tk
+from typing import Any, Callable, cast
+
+
+class ModSearchIndex():
+    """Case-insensitive substring search over mod names, prefix matches first.
+
+    A query that extends the previous one only filters the previous results,
+    so typing a name narrows the list without rescanning the whole catalog.
+    """
+
+    def __init__(self, names: list[str]) -> None:
+        self.names = names
+        self.keys = [name.lower() for name in names]
+        self.last_query = ""
+        self.last_result = list(range(len(names)))
+
+    def search(self, query: str) -> list[str]:
+        query = query.strip().lower()
+        if query.startswith(self.last_query):
+            candidates = self.last_result
+        else:
+            candidates = range(len(self.names))
+        result = [i for i in candidates if query in self.keys[i]]
+        self.last_query, self.last_result = query, result
+        return [
+            self.names[i]
+            for i in sorted(result, key=lambda i: (not self.keys[i].startswith(query), i))
+        ]
+
+
+class ModPicker(tk.Frame):
+    """Searchable multi-select mod list shared by the installer and launcher windows.
+
+    Only the visible rows exist in the Listbox; scrolling re-renders them from
+    the filtered list, so opening the picker costs the same for any catalog
+    size. The selection is kept by name and survives filtering.
+    """
+
+    def __init__(self, parent: tk.Misc, mods: list[str], selected: list[str], height: int = 5) -> None:
+        super().__init__(parent)
+        self.index = ModSearchIndex(mods)
+        self.mods = mods
+        self.selected = set(selected)
+        self.filtered = mods
+        self.top = 0
+        self.height = max(1, min(height, len(mods)))
+        self.pending_search: str | None = None
+
+        tk.Label(self, text="Mods to Install:").pack(anchor=tk.W)
+        self.search_var = tk.StringVar()
+        self.search_var.trace_add("write", lambda *_: self._schedule_search())
+        tk.Entry(self, textvariable=self.search_var).pack(anchor=tk.W, fill=tk.X, pady=(0, 5))
+
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox = tk.Listbox(
+            self, selectmode=tk.MULTIPLE, height=self.height, exportselection=False
+        )
+        self.listbox.pack(anchor=tk.W, fill=tk.X)
+        self.listbox.bind("<<ListboxSelect>>", self._on_select)
+        self.listbox.bind("<MouseWheel>", self._on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda _: self._scroll_to(self.top - 1))
+        self.listbox.bind("<Button-5>", lambda _: self._scroll_to(self.top + 1))
+        self._render()
+
+    def get_selected(self) -> list[str]:
+        """Selected mods, in catalog order."""
+        return [mod for mod in self.mods if mod in self.selected]
+
+    def set_selected(self, mods: list[str]) -> None:
+        self.selected = set(mods)
+        self._render()
+
+    def _schedule_search(self) -> None:
+        # Coalesce keystrokes into a single filter and redraw
+        if self.pending_search is not None:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(100, self._search)
+
+    def _search(self) -> None:
+        self.pending_search = None
+        self.filtered = self.index.search(self.search_var.get())
+        self.top = 0
+        self._render()
+
+    def _render(self) -> None:
+        rows = self.filtered[self.top:self.top + self.height]
+        self.listbox.delete(0, tk.END)
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        for i, mod in enumerate(rows):
+            if mod in self.selected:
+                self.listbox.selection_set(i)
+        if self.filtered:
+            self.scrollbar.set(
+                self.top / len(self.filtered),
+                (self.top + len(rows)) / len(self.filtered),
+            )
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _scroll_to(self, top: int) -> str:
+        top = max(0, min(top, len(self.filtered) - self.height))
+        if top != self.top:
+            self.top = top
+            self._render()
+        return "break"
+
+    def _on_scrollbar(self, action: str, value: str, unit: str | None = None) -> None:
+        if action == tk.MOVETO:
+            self._scroll_to(round(float(value) * len(self.filtered)))
+        elif action == tk.SCROLL:
+            step = self.height if unit == tk.PAGES else 1
+            self._scroll_to(self.top + int(value) * step)
+
+    def _on_mousewheel(self, event: Any) -> str:
+        if sys.platform == "darwin":
+            return self._scroll_to(self.top - int(event.delta))
+        return self._scroll_to(self.top - int(event.delta / 120))
+
+    def _on_select(self, _: Any = None) -> None:
+        rows = self.filtered[self.top:self.top + self.height]
+        shown = set(cast(Callable[[], list[int]], self.listbox.curselection)())
+        for i, mod in enumerate(rows):
+            if i in shown:
+                self.selected.add(mod)
+            else:
+                self.selected.discard(mod)
+
+
+__all__ = ["ModSearchIndex", "ModPicker"]
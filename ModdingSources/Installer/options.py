@@ -7,6 +7,8 @@ import yaml
 class Options:
     game_install_path: str | None  # Path to the game installation directory
     mod_list: list[str]  # List of mods to install
+    mod_profiles: dict[str, list[str]] | None  # Named mod lists, each kept as a prebuilt Mods directory
+    active_profile: str | None  # Mod profile to launch with, None to use mod_list directly
     no_window: bool  # Wether to run the installer without a GUI
     auto_run: bool  # Wether to auto-run the game after installation
     start_on_startup: bool  # Wether to start the installer on system startup
@@ -17,10 +19,19 @@ class Options:
     restore_backup_on_failure: (
         bool  # Wether to restore from backup if installation fails
     )
+    backup_mode: str | None  # How to backup game files, "zip" (default) or "snapshot"
+    json_logs: bool  # Wether to write installer.log as JSON lines with stage timings
+    telemetry_interval: float | None  # Seconds between game resource samples, None to disable
     setting_save_path: str | None  # Path to save the installer settings
     installer_install_path: (
         str | None
     )  # Path where the installer will be installed in case it isn't installed and freshly downloaded
+    verify: bool  # Wether to check the install against the published artifacts and repair it, then exit
+    fleet: str | None  # Path to a fleet file listing game installations to update headlessly
+    fleet_report: str | None  # Path to write the fleet summary report to
+    prefetch: bool  # Wether to run as a background daemon prefetching updates
+    prefetch_interval: int | None  # Seconds between two prefetch passes
+    prefetch_bandwidth_limit: int | None  # Maximum prefetch download speed in bytes per second
 
 
 def parse_options():
@@ -34,6 +45,12 @@ def parse_options():
     parser.add_argument(
         "--mod_list", type=str, nargs="*", help="List of mods to install", default=[]
     )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        help="Mod profile to launch with, created from the mod list if it doesn't exist",
+        default=None,
+    )
     parser.add_argument(
         "--no_window",
         action="store_true",
@@ -82,6 +99,25 @@ def parse_options():
         help="Restore from backup if installation fails",
         default=False,
     )
+    parser.add_argument(
+        "--backup_mode",
+        type=str,
+        choices=["zip", "snapshot"],
+        help="Backup game files as a zip archive or as a snapshot storing only changed files",
+        default=None,
+    )
+    parser.add_argument(
+        "--json_logs",
+        action="store_true",
+        help="Write the installer log as JSON lines with stage timings",
+        default=False,
+    )
+    parser.add_argument(
+        "--telemetry_interval",
+        type=float,
+        help="Record the game's resource usage every this many seconds",
+        default=None,
+    )
     parser.add_argument(
         "--setting_save_path",
         type=str,
@@ -94,6 +130,42 @@ def parse_options():
         help="Path where the installer will be installed",
         default=None,
     )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check the installed files against the published releases, repair mismatches and exit",
+        default=False,
+    )
+    parser.add_argument(
+        "--fleet",
+        type=str,
+        help="Update every game installation listed in this fleet file, then exit",
+        default=None,
+    )
+    parser.add_argument(
+        "--fleet_report",
+        type=str,
+        help="Path to write the fleet summary report to",
+        default=None,
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Run in the background, downloading updates ahead of the next launch",
+        default=False,
+    )
+    parser.add_argument(
+        "--prefetch_interval",
+        type=int,
+        help="Seconds between two prefetch passes",
+        default=None,
+    )
+    parser.add_argument(
+        "--prefetch_bandwidth_limit",
+        type=int,
+        help="Maximum prefetch download speed in bytes per second",
+        default=None,
+    )
 
     # Parse the arguments
     args = parser.parse_args()
@@ -102,6 +174,8 @@ def parse_options():
     options = Options()
     options.game_install_path = args.game_install_path
     options.mod_list = args.mod_list
+    options.mod_profiles = None
+    options.active_profile = args.profile
     options.no_window = args.no_window
     options.auto_run = args.auto_run
     options.start_on_startup = args.start_on_startup
@@ -110,8 +184,17 @@ def parse_options():
     options.auto_update_game = args.auto_update_game
     options.backup_before_install = args.backup_before_install
     options.restore_backup_on_failure = args.restore_backup_on_failure
+    options.backup_mode = args.backup_mode
+    options.json_logs = args.json_logs
+    options.telemetry_interval = args.telemetry_interval
     options.setting_save_path = args.setting_save_path
     options.installer_install_path = args.installer_install_path
+    options.verify = args.verify
+    options.fleet = args.fleet
+    options.fleet_report = args.fleet_report
+    options.prefetch = args.prefetch
+    options.prefetch_interval = args.prefetch_interval
+    options.prefetch_bandwidth_limit = args.prefetch_bandwidth_limit
 
     return options
 
@@ -0,0 +1,176 @@
+import ctypes
+import logging
+import os
+import sys
+import time
+
+import requests
+
+from constants import (
+    GAME_DOWNLOAD_URL,
+    INSTALLER_DOWNLOAD_URL,
+    MOD_LOADER_DOWNLOAD_URL,
+    UPDATER_DOWNLOAD_URL,
+)
+from download import (
+    Url,
+    download_file,
+    load_manifest,
+    save_manifest,
+    sha256,
+    staged_name,
+)
+from mods import AVAILABLE_MODS
+from options import Options, load_config
+from release import check_release
+
+DEFAULT_PREFETCH_INTERVAL = 6 * 60 * 60  # Seconds between two prefetch passes
+DEFAULT_PREFETCH_BANDWIDTH_LIMIT = 1024 * 1024  # Bytes per second
+
+
+def staging_dir(options: Options) -> str:
+    """Directory where prefetched artifacts wait to be applied by the launcher."""
+    assert options.installer_install_path is not None, "Installer install path must be set."
+    return os.path.join(options.installer_install_path, "staging")
+
+
+def prefetch_artifacts(options: Options) -> list[Url]:
+    """Urls the launcher would download on its next start with these options."""
+    urls: list[Url] = []
+    if options.auto_update_installer:
+        urls += [UPDATER_DOWNLOAD_URL, INSTALLER_DOWNLOAD_URL]
+    if options.auto_update_game:
+        urls.append(GAME_DOWNLOAD_URL)
+    if options.auto_update_game or options.auto_update_installer:
+        urls.append(MOD_LOADER_DOWNLOAD_URL)
+    for mod_name in options.mod_list:
+        if mod_name in AVAILABLE_MODS:
+            urls.append(AVAILABLE_MODS[mod_name])
+    return list(dict.fromkeys(urls))
+
+
+def verify_artifact(path: str, url: Url) -> None:
+    """Raise if the downloaded artifact at path is unusable."""
+    if url in (GAME_DOWNLOAD_URL, MOD_LOADER_DOWNLOAD_URL):
+        check_release(path)
+
+
+def prefetch_once(options: Options, bandwidth_limit: int | None = None) -> None:
+    """Download and verify every outdated artifact into the staging area."""
+    stage_urls(
+        staging_dir(options),
+        prefetch_artifacts(options),
+        bandwidth_limit,
+        options.prefetch_interval or DEFAULT_PREFETCH_INTERVAL,
+    )
+
+
+def stage_urls(
+    staging_path: str,
+    urls: list[Url],
+    bandwidth_limit: int | None = None,
+    max_age: int = DEFAULT_PREFETCH_INTERVAL,
+) -> dict[Url, str]:
+    """Download and verify each url whose staged copy is missing or outdated.
+
+    Staged copies are trusted for max_age seconds, then revalidated with the
+    server before use. Returns the error of each url that could not be fetched.
+    """
+    os.makedirs(staging_path, exist_ok=True)
+    manifest = load_manifest(staging_path)
+    failures: dict[Url, str] = {}
+
+    for url in urls:
+        entry = manifest.get(url)
+        path = os.path.join(staging_path, staged_name(url))
+        part = path + ".part"
+        headers: dict[str, str] = {}
+        if entry is not None and entry.get("etag") and os.path.exists(path):
+            headers["If-None-Match"] = entry["etag"]
+
+        try:
+            response = download_file(url, part, bandwidth_limit, headers)
+            if response.status_code == 304:
+                logging.info(f"Staged artifact is up to date: {url}")
+                assert entry is not None
+                entry["fetched_at"], entry["max_age"] = time.time(), max_age
+                save_manifest(staging_path, manifest)
+                continue
+
+            expected_size = response.headers.get("Content-Length")
+            if (
+                expected_size is not None
+                and "Content-Encoding" not in response.headers
+                and os.path.getsize(part) != int(expected_size)
+            ):
+                raise ValueError("Truncated download")
+            verify_artifact(part, url)
+
+            digest = sha256(part)
+            if entry is not None and entry["sha256"] == digest and os.path.exists(path):
+                os.remove(part)
+            else:
+                os.replace(part, path)
+                logging.info(f"Staged new version of {url}")
+            manifest[url] = {
+                "file": os.path.basename(path),
+                "sha256": digest,
+                "size": os.path.getsize(path),
+                "etag": response.headers.get("ETag"),
+                "fetched_at": time.time(),
+                "max_age": max_age,
+            }
+            save_manifest(staging_path, manifest)
+        except (requests.RequestException, OSError, ValueError) as e:
+            logging.warning(f"Failed to prefetch {url}: {e}")
+            failures[url] = str(e)
+            if os.path.exists(part):
+                os.remove(part)
+    return failures
+
+
+def lower_priority() -> None:
+    """Run the current process with background priority.
+
+    Windows' background mode lowers both CPU and I/O priority, elsewhere only
+    the CPU priority is lowered.
+    """
+    try:
+        if sys.platform == "win32":
+            kernel32 = ctypes.windll.kernel32
+            PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000
+            kernel32.SetPriorityClass(
+                kernel32.GetCurrentProcess(), PROCESS_MODE_BACKGROUND_BEGIN
+            )
+        else:
+            os.nice(10)
+    except (OSError, AttributeError) as e:
+        logging.warning(f"Could not lower process priority: {e}")
+
+
+def run_prefetch(options: Options) -> None:
+    """Prefetch updates forever, waiting prefetch_interval seconds between passes."""
+    interval = options.prefetch_interval or DEFAULT_PREFETCH_INTERVAL
+    bandwidth_limit = options.prefetch_bandwidth_limit or DEFAULT_PREFETCH_BANDWIDTH_LIMIT
+    lower_priority()
+    logging.info(
+        f"Prefetching updates every {interval}s at up to {bandwidth_limit} bytes/s."
+    )
+    while True:
+        # Pick up mods selected in the launcher since the last pass
+        if options.setting_save_path and os.path.exists(options.setting_save_path):
+            config = load_config(options.setting_save_path) or {}
+            options.mod_list = config.get("mod_list", [])
+        prefetch_once(options, bandwidth_limit)
+        time.sleep(interval)
+
+
+__all__ = [
+    "DEFAULT_PREFETCH_INTERVAL",
+    "DEFAULT_PREFETCH_BANDWIDTH_LIMIT",
+    "staging_dir",
+    "prefetch_artifacts",
+    "prefetch_once",
+    "stage_urls",
+    "run_prefetch",
+]
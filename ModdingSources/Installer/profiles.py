@@ -0,0 +1,181 @@
+import logging
+import os
+import shutil
+
+from blobs import BlobStore, clone_file, sibling_path
+from download import fetch_artifact
+from mods import AVAILABLE_MODS
+from options import load_config, save_config
+
+UNMANAGED_SLOT = ".unmanaged"  # Mods directory in use while no profile is active
+
+
+def profiles_path(game_install_path: str) -> str:
+    return sibling_path(game_install_path, ".profiles")
+
+
+def active_profile(game_install_path: str) -> str | None:
+    """Name of the profile currently in the game's Mods directory, if any."""
+    marker = os.path.join(profiles_path(game_install_path), "active")
+    if not os.path.exists(marker):
+        return None
+    with open(marker, "r") as f:
+        return f.read().strip() or None
+
+
+def _write_name(path: str, name: str | None) -> None:
+    with open(path + ".tmp", "w") as f:
+        f.write(name or "")
+    os.replace(path + ".tmp", path)
+
+
+def _set_active_profile(game_install_path: str, name: str | None) -> None:
+    _write_name(os.path.join(profiles_path(game_install_path), "active"), name)
+
+
+def _recover_switch(game_install_path: str) -> None:
+    """Finish or undo a profile switch that was interrupted."""
+    mods_dir = os.path.join(game_install_path, "Mods")
+    journal = os.path.join(profiles_path(game_install_path), "switching")
+    if os.path.exists(journal):
+        with open(journal, "r") as f:
+            target = f.read().strip() or None
+        # The active profile is parked only once the switch started moving directories
+        parked = _slot(game_install_path, active_profile(game_install_path))
+        if os.path.isdir(mods_dir) and os.path.isdir(parked):
+            logging.warning(f"Finishing interrupted switch to mod profile: {target or 'none'}")
+            _set_active_profile(game_install_path, target)
+        os.remove(journal)
+
+    parked = _slot(game_install_path, active_profile(game_install_path))
+    if not os.path.isdir(mods_dir) and os.path.isdir(parked):
+        logging.warning("Restoring the Mods directory parked by an interrupted switch.")
+        os.replace(parked, mods_dir)
+    # Left behind when a rebuild of the active profile was interrupted
+    shutil.rmtree(parked + ".replaced", ignore_errors=True)
+
+
+def _slot(game_install_path: str, name: str | None) -> str:
+    return os.path.join(profiles_path(game_install_path), "slots", name or UNMANAGED_SLOT)
+
+
+def cached_mod(game_install_path: str, url: str, staging_path: str | None = None) -> str:
+    """Return the content-addressed blob holding the mod at url, downloading it if needed."""
+    root = profiles_path(game_install_path)
+    blobs = BlobStore(os.path.join(root, "blobs"))
+    index_path = os.path.join(root, "index.yaml")
+    os.makedirs(root, exist_ok=True)
+    index: dict[str, str] = (load_config(index_path) or {}) if os.path.exists(index_path) else {}
+
+    if url in index and os.path.exists(blobs.path(index[url])):
+        return blobs.path(index[url])
+
+    tmp = os.path.join(root, "download.tmp")
+    fetch_artifact(url, tmp, staging_path)
+    index[url] = blobs.add(tmp)
+    os.remove(tmp)
+    save_config(index_path + ".tmp", index)
+    os.replace(index_path + ".tmp", index_path)
+    return blobs.path(index[url])
+
+
+def _is_built(slot: str, mod_list: list[str]) -> bool:
+    if not os.path.isdir(slot):
+        return False
+    installed = {
+        os.path.splitext(f)[0]
+        for f in os.listdir(slot)
+        if f.endswith(".dll") and os.path.splitext(f)[0] in AVAILABLE_MODS
+    }
+    return installed == {mod for mod in mod_list if mod in AVAILABLE_MODS}
+
+
+def build_profile(
+    game_install_path: str,
+    name: str,
+    mod_list: list[str],
+    staging_path: str | None = None,
+) -> None:
+    """Materialize the Mods directory of a profile as hardlinks to cached mod blobs."""
+    # Download everything first, so a failure leaves no half-built slot behind
+    blobs: dict[str, str] = {}
+    for mod_name in mod_list:
+        if mod_name not in AVAILABLE_MODS:
+            logging.warning(f"Mod '{mod_name}' not found in available mods.")
+            continue
+        blobs[mod_name] = cached_mod(game_install_path, AVAILABLE_MODS[mod_name], staging_path)
+
+    slot = _slot(game_install_path, name)
+    building = slot + ".new"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+    for mod_name, blob in blobs.items():
+        dest = os.path.join(building, f"{mod_name}.dll")
+        try:
+            os.link(blob, dest)
+        except OSError:
+            clone_file(blob, dest)
+    shutil.rmtree(slot, ignore_errors=True)
+    os.replace(building, slot)
+    logging.info(f"Built profile '{name}' with mods: {mod_list}")
+
+
+def switch_profile(
+    game_install_path: str,
+    name: str | None,
+    mod_list: list[str] | None = None,
+    staging_path: str | None = None,
+) -> None:
+    """Make profile name the game's Mods directory, or restore the unmanaged one for None.
+
+    The target slot is built first, so a failed download leaves the live
+    Mods directory untouched. Then the current Mods directory is parked in its
+    slot and the target slot is renamed into place, so switching never
+    touches individual mod files. A profile is only (re)built when its slot is
+    missing or does not match mod_list. The marker keeps naming the parked
+    profile until the target is in place, and a journal names the target, so
+    an interrupted switch is finished or undone on the next call.
+    """
+    mods_dir = os.path.join(game_install_path, "Mods")
+    _recover_switch(game_install_path)
+    current = active_profile(game_install_path)
+    if current == name and (name is None or os.path.isdir(mods_dir)):
+        if name is None or mod_list is None or _is_built(mods_dir, mod_list):
+            return
+    os.makedirs(os.path.dirname(_slot(game_install_path, None)), exist_ok=True)
+
+    target = _slot(game_install_path, name)
+    if name is not None and mod_list is not None and not _is_built(target, mod_list):
+        build_profile(game_install_path, name, mod_list, staging_path)
+
+    if current == name:
+        # Rebuilding the live profile, its old directory moves aside for the new slot
+        parked = target + ".replaced"
+    else:
+        parked = _slot(game_install_path, current)
+    if os.path.isdir(mods_dir) and current is not None:
+        shutil.rmtree(parked, ignore_errors=True)
+
+    # Only renames from here on
+    journal = os.path.join(profiles_path(game_install_path), "switching")
+    _write_name(journal, name)
+    if os.path.isdir(mods_dir):
+        os.replace(mods_dir, parked)
+    if os.path.isdir(target):
+        os.replace(target, mods_dir)
+    else:
+        os.makedirs(mods_dir)
+    _set_active_profile(game_install_path, name)
+    os.remove(journal)
+    if current == name:
+        shutil.rmtree(parked, ignore_errors=True)
+    logging.info(f"Switched to mod profile: {name or 'none'}")
+
+
+__all__ = [
+    "profiles_path",
+    "active_profile",
+    "cached_mod",
+    "build_profile",
+    "switch_profile",
+]
@@ -0,0 +1,180 @@
+import gzip
+import io
+import logging
+import lzma
+import os
+import shutil
+import tarfile
+import zipfile
+from typing import IO, Mapping
+
+import requests
+
+from download import Url, staged_artifact
+
+# Leading bytes of each supported release archive format
+_MAGIC: list[tuple[bytes, str]] = [
+    (b"PK\x03\x04", "zip"),
+    (b"\xfd7zXZ\x00", "tar.xz"),
+    (b"\x28\xb5\x2f\xfd", "tar.zst"),
+    (b"\x1f\x8b", "tar.gz"),
+]
+
+_CONTENT_TYPES: dict[str, str] = {
+    "application/zip": "zip",
+    "application/x-zip-compressed": "zip",
+    "application/x-xz": "tar.xz",
+    "application/zstd": "tar.zst",
+    "application/gzip": "tar.gz",
+    "application/x-gzip": "tar.gz",
+}
+
+
+def detect_format(head: bytes, headers: Mapping[str, str] | None = None) -> str:
+    """Tell which archive format a release is in, from its first bytes or response headers.
+
+    The bytes win, as the headers follow the asset name, which may still end
+    in .zip for a tar. Zip is assumed when nothing matches, as it is what
+    releases used to be.
+    """
+    for magic, archive_format in _MAGIC:
+        if head.startswith(magic):
+            return archive_format
+    if headers is not None:
+        disposition = headers.get("Content-Disposition", "")
+        for extension in ("tar.zst", "tar.xz", "tar.gz", "zip"):
+            if f".{extension}" in disposition:
+                return extension
+        content_type = headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type in _CONTENT_TYPES:
+            return _CONTENT_TYPES[content_type]
+    return "zip"
+
+
+def detect_file_format(path: str) -> str:
+    with open(path, "rb") as f:
+        return detect_format(f.read(8))
+
+
+def open_decompressed(fileobj: IO[bytes], archive_format: str) -> IO[bytes]:
+    """Wrap a compressed tar stream so it can be read in a single forward pass."""
+    if archive_format == "tar.xz":
+        return lzma.LZMAFile(fileobj)
+    if archive_format == "tar.gz":
+        return gzip.GzipFile(fileobj=fileobj)
+    if archive_format == "tar.zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("The zstandard package is required for .tar.zst releases.")
+        return zstandard.ZstdDecompressor().stream_reader(fileobj)
+    raise ValueError(f"Unsupported release format: {archive_format}")
+
+
+def release_members(zip_ref: zipfile.ZipFile) -> list[tuple[zipfile.ZipInfo, str]]:
+    """Pair each file of a release zip with its path relative to the game directory."""
+    members = [m for m in zip_ref.infolist() if not m.is_dir()]
+    split_paths = [m.filename.split('/') for m in members]
+    top_levels = {p[0] for p in split_paths}
+
+    # If there's a single top-level directory, then it's double-wrapped
+    if len(top_levels) == 1:
+        return [(m, os.path.join(*parts[1:])) for m, parts in zip(members, split_paths)]
+    return [(m, os.path.join(*parts)) for m, parts in zip(members, split_paths)]
+
+
+def unpack_tar(stream: IO[bytes], dest: str) -> list[str]:
+    """Extract a tar stream into dest in one pass and return the relative file paths.
+
+    Whether the archive is wrapped in a single top-level directory is only
+    known at the end, so that directory is stripped afterwards with renames.
+    """
+    split_paths: list[list[str]] = []
+    with tarfile.open(fileobj=stream, mode="r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            parts = [p for p in member.name.split("/") if p not in ("", ".")]
+            if not parts or ".." in parts or os.path.isabs(member.name):
+                raise ValueError(f"Unsafe path in release archive: {member.name}")
+            path = os.path.join(dest, *parts)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            src = tar.extractfile(member)
+            assert src is not None
+            with src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            split_paths.append(parts)
+
+    top_levels = {p[0] for p in split_paths}
+    if len(top_levels) != 1 or any(len(parts) == 1 for parts in split_paths):
+        return [os.path.join(*parts) for parts in split_paths]
+
+    # If there's a single top-level directory, then it's double-wrapped
+    wrapper = os.path.join(dest, top_levels.pop())
+    unwrapped = dest + ".unwrapped"
+    os.replace(wrapper, unwrapped)
+    for entry in os.listdir(unwrapped):
+        os.replace(os.path.join(unwrapped, entry), os.path.join(dest, entry))
+    os.rmdir(unwrapped)
+    return [os.path.join(*parts[1:]) for parts in split_paths]
+
+
+def check_release(path: str) -> None:
+    """Raise ValueError if the release archive at path is corrupted."""
+    archive_format = detect_file_format(path)
+    try:
+        if archive_format == "zip":
+            with zipfile.ZipFile(path, "r") as zip_ref:
+                bad_member = zip_ref.testzip()
+            if bad_member is not None:
+                raise ValueError(f"Corrupted member {bad_member}")
+            return
+        with open(path, "rb") as f:
+            stream = open_decompressed(f, archive_format)
+            with tarfile.open(fileobj=stream, mode="r|") as tar:
+                for member in tar:
+                    src = tar.extractfile(member)
+                    if src is not None:
+                        while src.read(1024 * 1024):
+                            pass
+            # tarfile stops at the end-of-archive blocks, the decompressor only
+            # checks the stream's trailer once it is read to the end
+            while stream.read(1024 * 1024):
+                pass
+    except ValueError:
+        raise
+    except Exception as e:
+        # Each decompressor has its own error types, zstandard's cannot be named without importing it
+        raise ValueError(f"Corrupted release archive: {e}") from e
+
+
+def open_release(url: Url, staging_path: str | None) -> tuple[io.BufferedReader, str]:
+    """Open a release for a single forward read and tell which format it is in.
+
+    The prefetched copy is used when there is one, otherwise the download is
+    streamed so tar releases can be unpacked while they arrive.
+    """
+    staged = staged_artifact(staging_path, url)
+    if staged is not None:
+        logging.info(f"Using prefetched {url}")
+        stream = io.BufferedReader(open(staged, "rb", buffering=0), buffer_size=1024 * 1024)
+        return stream, detect_format(stream.peek(8)[:8])
+
+    response = requests.get(url, stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    # Otherwise a small release is closed as soon as the format sniffing reads all of it
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw, buffer_size=1024 * 1024)
+    return stream, detect_format(stream.peek(8)[:8], response.headers)
+
+
+__all__ = [
+    "detect_format",
+    "detect_file_format",
+    "open_decompressed",
+    "release_members",
+    "unpack_tar",
+    "check_release",
+    "open_release",
+]
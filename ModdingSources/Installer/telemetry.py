@@ -0,0 +1,189 @@
+import collections
+import ctypes
+import logging
+import os
+import sys
+import time
+from typing import Any
+
+import yaml
+
+type Sample = tuple[float, float, int, int, int, int]  # (seconds since launch, cpu seconds, rss bytes, threads, read bytes, write bytes)
+
+DEFAULT_TELEMETRY_CAPACITY = 3600  # Samples kept in the ring buffer
+THREAD_COUNT_REFRESH = 10.0  # Seconds a Windows thread count is reused, as listing every process is costly
+
+_thread_counts: dict[int, tuple[float, int]] = {}  # pid -> (when it was counted, thread count)
+
+
+def _read_linux(pid: int) -> tuple[float, int, int, int, int]:
+    with open(f"/proc/{pid}/stat", "r") as f:
+        stat = f.read()
+    # The command name may contain spaces, fields are counted after it
+    fields = stat[stat.rindex(")") + 2:].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    threads = int(fields[17])
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key == "read_bytes":
+                    read_bytes = int(value)
+                elif key == "write_bytes":
+                    write_bytes = int(value)
+    except OSError:
+        pass  # Needs the same user and ptrace rights, CPU and memory still work
+    return cpu, rss, threads, read_bytes, write_bytes
+
+
+class _ProcessMemoryCounters(ctypes.Structure):
+    _fields_ = [
+        ("cb", ctypes.c_uint32),
+        ("PageFaultCount", ctypes.c_uint32),
+        ("PeakWorkingSetSize", ctypes.c_size_t),
+        ("WorkingSetSize", ctypes.c_size_t),
+        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+        ("PagefileUsage", ctypes.c_size_t),
+        ("PeakPagefileUsage", ctypes.c_size_t),
+    ]
+
+
+class _IoCounters(ctypes.Structure):
+    _fields_ = [
+        ("ReadOperationCount", ctypes.c_uint64),
+        ("WriteOperationCount", ctypes.c_uint64),
+        ("OtherOperationCount", ctypes.c_uint64),
+        ("ReadTransferCount", ctypes.c_uint64),
+        ("WriteTransferCount", ctypes.c_uint64),
+        ("OtherTransferCount", ctypes.c_uint64),
+    ]
+
+
+class _ProcessEntry32(ctypes.Structure):
+    _fields_ = [
+        ("dwSize", ctypes.c_uint32),
+        ("cntUsage", ctypes.c_uint32),
+        ("th32ProcessID", ctypes.c_uint32),
+        ("th32DefaultHeapID", ctypes.c_size_t),
+        ("th32ModuleID", ctypes.c_uint32),
+        ("cntThreads", ctypes.c_uint32),
+        ("th32ParentProcessID", ctypes.c_uint32),
+        ("pcPriClassBase", ctypes.c_int32),
+        ("dwFlags", ctypes.c_uint32),
+        ("szExeFile", ctypes.c_wchar * 260),
+    ]
+
+
+def _read_windows(pid: int) -> tuple[float, int, int, int, int]:
+    kernel32 = ctypes.windll.kernel32
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        raise OSError(f"Cannot open process {pid}")
+    try:
+        creation, exit_, kernel, user = (ctypes.c_uint64() for _ in range(4))
+        kernel32.GetProcessTimes(
+            handle, ctypes.byref(creation), ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user)
+        )
+        memory = _ProcessMemoryCounters()
+        memory.cb = ctypes.sizeof(memory)
+        kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb)
+        io = _IoCounters()
+        kernel32.GetProcessIoCounters(handle, ctypes.byref(io))
+    finally:
+        kernel32.CloseHandle(handle)
+
+    cpu = (kernel.value + user.value) / 10_000_000  # 100ns units
+    return cpu, memory.WorkingSetSize, _windows_threads(pid), io.ReadTransferCount, io.WriteTransferCount
+
+
+def _windows_threads(pid: int) -> int:
+    cached = _thread_counts.get(pid)
+    if cached is not None and time.monotonic() - cached[0] < THREAD_COUNT_REFRESH:
+        return cached[1]
+    kernel32 = ctypes.windll.kernel32
+    TH32CS_SNAPPROCESS = 0x2
+
+    threads = 0
+    snapshot = kernel32.CreateToolhelp32Snapshot(TH32CS_SNAPPROCESS, 0)
+    try:
+        entry = _ProcessEntry32()
+        entry.dwSize = ctypes.sizeof(entry)
+        found = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+        while found:
+            if entry.th32ProcessID == pid:
+                threads = entry.cntThreads
+                break
+            found = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+    finally:
+        kernel32.CloseHandle(snapshot)
+    _thread_counts[pid] = (time.monotonic(), threads)
+    return threads
+
+
+def read_process(pid: int) -> tuple[float, int, int, int, int]:
+    """Return (cpu seconds, rss bytes, threads, read bytes, write bytes) of a process."""
+    if sys.platform == "win32":
+        return _read_windows(pid)
+    return _read_linux(pid)
+
+
+class ResourceSampler():
+    """Ring buffer of resource samples of one game session, with running peaks."""
+
+    def __init__(self, pid: int, started_at: float, capacity: int = DEFAULT_TELEMETRY_CAPACITY) -> None:
+        self.pid = pid
+        self.started_at = started_at
+        self.samples: collections.deque[Sample] = collections.deque(maxlen=capacity)
+        self.sample_count = 0
+        self.rss_total = 0
+        self.peak_rss = 0
+        self.peak_threads = 0
+
+    def sample(self) -> None:
+        try:
+            cpu, rss, threads, read_bytes, write_bytes = read_process(self.pid)
+        except (OSError, ValueError, IndexError) as e:
+            logging.debug(f"Could not sample process {self.pid}: {e}")
+            return
+        self.samples.append(
+            (round(time.monotonic() - self.started_at, 3), cpu, rss, threads, read_bytes, write_bytes)
+        )
+        self.sample_count += 1
+        self.rss_total += rss
+        self.peak_rss = max(self.peak_rss, rss)
+        self.peak_threads = max(self.peak_threads, threads)
+
+    def summary(self, mod_loading_latency: float | None, mods: list[str]) -> dict[str, Any]:
+        last = self.samples[-1] if self.samples else (0.0, 0.0, 0, 0, 0, 0)
+        return {
+            "mods": mods,
+            "duration": last[0],
+            "mod_loading_latency": mod_loading_latency,
+            "cpu_time": last[1],
+            "peak_rss": self.peak_rss,
+            "mean_rss": self.rss_total // self.sample_count if self.sample_count else 0,
+            "peak_threads": self.peak_threads,
+            "read_bytes": last[4],
+            "write_bytes": last[5],
+            "sample_count": self.sample_count,
+            # Oldest samples are dropped once the ring buffer is full
+            "samples": [list(s) for s in self.samples],
+        }
+
+    def export(self, path: str, mod_loading_latency: float | None, mods: list[str]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as file:
+            # Flow style keeps each sample on a single line
+            yaml.safe_dump(self.summary(mod_loading_latency, mods), file, default_flow_style=None)
+        logging.info(f"Game session telemetry written to {path}")
+
+
+__all__ = ["DEFAULT_TELEMETRY_CAPACITY", "read_process", "ResourceSampler"]
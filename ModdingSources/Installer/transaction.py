@@ -0,0 +1,212 @@
+import filecmp
+import logging
+import mmap
+import os
+import shutil
+import zipfile
+import zlib
+from typing import IO
+
+from blobs import clone_file, sibling_path
+from options import load_config, save_config
+from release import release_members, unpack_tar
+
+JOURNAL_NAME = "journal.yaml"
+
+
+def staging_path_for(install_path: str) -> str:
+    return sibling_path(install_path, ".staging")
+
+
+def crc32(path: str) -> int:
+    """CRC-32 of a file, as stored in zip central directories."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        # zlib releases the GIL on the mapped buffer, so this scales across threads
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return zlib.crc32(mapped)
+
+
+class InstallTransaction():
+    """Prepare changed files next to an install and swap them in with a few renames.
+
+    New files are written to ``<install>.staging/new``. On commit the live files
+    they replace are renamed into ``<install>.staging/old`` and the new ones are
+    renamed into place. A journal lists every path while the commit runs, so an
+    interrupted commit can be finished or undone by ``recover``.
+    """
+
+    def __init__(self, install_path: str) -> None:
+        self.install_path = os.path.abspath(install_path)
+        self.staging_path = staging_path_for(self.install_path)
+        self.new_path = os.path.join(self.staging_path, "new")
+        self.old_path = os.path.join(self.staging_path, "old")
+        self.journal_path = os.path.join(self.staging_path, JOURNAL_NAME)
+        self.files: list[str] = []  # Relative paths to replace or create
+        self.removals: list[str] = []  # Relative paths to delete
+        if os.path.exists(self.journal_path):
+            recover(self.install_path)
+        shutil.rmtree(self.staging_path, ignore_errors=True)
+
+    @property
+    def dirty(self) -> bool:
+        """Whether a commit was interrupted and the install may be half-updated."""
+        return os.path.exists(self.journal_path)
+
+    def staged_path(self, relative_path: str) -> str:
+        """Return the path to write the new version of relative_path into."""
+        path = os.path.join(self.new_path, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if relative_path not in self.files:
+            self.files.append(relative_path)
+        if relative_path in self.removals:
+            self.removals.remove(relative_path)
+        return path
+
+    def stage_file(self, source: str, relative_path: str) -> None:
+        """Stage a copy of source as the new relative_path, unless the live file already matches.
+
+        The copy never shares the source's inode, so a file the game rewrites
+        in place cannot change the source or the other installs staged from it.
+        """
+        live = os.path.join(self.install_path, relative_path)
+        if (
+            os.path.isfile(live)
+            and os.path.getsize(live) == os.path.getsize(source)
+            and filecmp.cmp(source, live, shallow=False)
+        ):
+            return
+        path = self.staged_path(relative_path)
+        if os.path.exists(path):
+            os.remove(path)
+        clone_file(source, path)
+
+    def stage_zip(self, zip_path: str) -> None:
+        """Stage every file of a release zip that differs from the installed one."""
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            for member, relative_path in release_members(zip_ref):
+                live = os.path.join(self.install_path, relative_path)
+                if (
+                    os.path.isfile(live)
+                    and os.path.getsize(live) == member.file_size
+                    and crc32(live) == member.CRC
+                ):
+                    continue
+                with zip_ref.open(member) as src, open(self.staged_path(relative_path), 'wb') as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    def stage_tar(self, stream: IO[bytes]) -> None:
+        """Stage every file of a decompressed release tar stream as it is read."""
+        unpack_path = os.path.join(self.staging_path, "unpack")
+        shutil.rmtree(unpack_path, ignore_errors=True)
+        os.makedirs(unpack_path)
+        # Unchanged files are dropped by commit, as tars carry no checksums to compare first
+        for relative_path in unpack_tar(stream, unpack_path):
+            os.replace(os.path.join(unpack_path, relative_path), self.staged_path(relative_path))
+        shutil.rmtree(unpack_path, ignore_errors=True)
+
+    def stage_removal(self, relative_path: str) -> None:
+        if relative_path not in self.removals:
+            self.removals.append(relative_path)
+
+    def commit(self) -> None:
+        """Swap the staged files into the install, rolling back on failure."""
+        # Drop files whose staged content is already live
+        self.files = [
+            relative_path
+            for relative_path in self.files
+            if not (
+                os.path.isfile(os.path.join(self.install_path, relative_path))
+                and filecmp.cmp(
+                    os.path.join(self.new_path, relative_path),
+                    os.path.join(self.install_path, relative_path),
+                    shallow=False,
+                )
+            )
+        ]
+        self.removals = [
+            relative_path
+            for relative_path in self.removals
+            if os.path.exists(os.path.join(self.install_path, relative_path))
+        ]
+        if not self.files and not self.removals:
+            logging.info("Nothing to update.")
+            self.discard()
+            return
+
+        journal = {
+            "files": self.files,
+            "removals": self.removals,
+            "created": [
+                relative_path
+                for relative_path in self.files
+                if not os.path.exists(os.path.join(self.install_path, relative_path))
+            ],
+        }
+        save_config(self.journal_path + ".tmp", journal)
+        os.replace(self.journal_path + ".tmp", self.journal_path)
+
+        try:
+            _roll_forward(self.install_path, self.staging_path, journal)
+        except OSError:
+            logging.error("Commit failed, rolling back.")
+            _roll_back(self.install_path, self.staging_path, journal)
+            os.remove(self.journal_path)
+            raise
+        os.remove(self.journal_path)
+        logging.info(
+            f"Committed {len(self.files)} updated and {len(self.removals)} removed files."
+        )
+        self.discard()
+
+    def discard(self) -> None:
+        """Delete the staging directory, unless a commit needs recovery."""
+        if not self.dirty:
+            shutil.rmtree(self.staging_path, ignore_errors=True)
+
+
+def _roll_forward(install_path: str, staging_path: str, journal: dict[str, list[str]]) -> None:
+    for relative_path in journal["files"] + journal["removals"]:
+        live = os.path.join(install_path, relative_path)
+        new = os.path.join(staging_path, "new", relative_path)
+        old = os.path.join(staging_path, "old", relative_path)
+        is_removal = relative_path in journal["removals"]
+        if not is_removal and not os.path.exists(new):
+            continue  # Already swapped in
+        if os.path.exists(live) and not os.path.exists(old):
+            os.makedirs(os.path.dirname(old), exist_ok=True)
+            os.replace(live, old)
+        if not is_removal:
+            os.makedirs(os.path.dirname(live), exist_ok=True)
+            os.replace(new, live)
+
+
+def _roll_back(install_path: str, staging_path: str, journal: dict[str, list[str]]) -> None:
+    for relative_path in journal["files"] + journal["removals"]:
+        live = os.path.join(install_path, relative_path)
+        old = os.path.join(staging_path, "old", relative_path)
+        if os.path.exists(old):
+            os.replace(old, live)
+        elif relative_path in journal["created"] and os.path.exists(live):
+            os.remove(live)
+
+
+def recover(install_path: str) -> None:
+    """Finish a commit that was interrupted, or undo it if it cannot complete."""
+    staging_path = staging_path_for(install_path)
+    journal_path = os.path.join(staging_path, JOURNAL_NAME)
+    if not os.path.exists(journal_path):
+        return
+    journal = load_config(journal_path)
+    logging.warning("Found an interrupted update, rolling it forward.")
+    try:
+        _roll_forward(install_path, staging_path, journal)
+    except OSError as e:
+        logging.error(f"Could not roll forward ({e}), rolling back instead.")
+        _roll_back(install_path, staging_path, journal)
+    os.remove(journal_path)
+    shutil.rmtree(staging_path, ignore_errors=True)
+
+
+__all__ = ["InstallTransaction", "crc32", "recover", "staging_path_for"]
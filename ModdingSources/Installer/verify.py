@@ -0,0 +1,216 @@
+import filecmp
+import io
+import logging
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from constants import GAME_DOWNLOAD_URL, MOD_LOADER_DOWNLOAD_URL
+from download import Url, fetch_artifact, staged_artifact
+from mods import AVAILABLE_MODS
+from options import Options
+from prefetch import staging_dir
+from release import detect_file_format, detect_format, open_decompressed, open_release, release_members, unpack_tar
+from transaction import InstallTransaction, crc32
+
+
+class HttpRangeFile(io.RawIOBase):
+    """Read-only, seekable view of a remote file fetched with HTTP range requests.
+
+    Lets zipfile read a release's central directory and single members
+    without downloading the whole archive.
+    """
+
+    def __init__(self, url: Url) -> None:
+        self.session = requests.Session()
+        response = self.session.head(url, allow_redirects=True)
+        response.raise_for_status()
+        if response.headers.get("Accept-Ranges") != "bytes":
+            raise ValueError(f"{url} does not support ranged downloads")
+        self.url = response.url
+        self.size = int(response.headers["Content-Length"])
+        self.position = 0
+        self.cache_start = 0
+        self.cache = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = offset
+        return self.position
+
+    def preload(self, start: int, end: int) -> None:
+        """Fetch bytes [start, end) in one request, for reads that will follow."""
+        end = min(end, self.size)
+        response = self.session.get(self.url, headers={"Range": f"bytes={start}-{end - 1}"})
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise ValueError(f"{self.url} ignored the range request")
+        self.cache_start, self.cache = start, response.content
+
+    def readinto(self, buffer) -> int:  # type: ignore
+        if self.position >= self.size:
+            return 0
+        length = min(len(buffer), self.size - self.position)
+        offset = self.position - self.cache_start
+        if not 0 <= offset < len(self.cache):
+            self.preload(self.position, self.position + length)
+            offset = 0
+        length = min(length, len(self.cache) - offset)
+        buffer[:length] = self.cache[offset:offset + length]
+        self.position += length
+        return length
+
+
+def _open_release(url: Url, staging_path: str) -> tuple[zipfile.ZipFile, HttpRangeFile | None] | None:
+    """Open the prefetched copy of a release zip, or the remote one through range requests.
+
+    Returns None for tar releases, which have no directory to read on its own.
+    """
+    staged = staged_artifact(staging_path, url)
+    if staged is not None:
+        if detect_file_format(staged) != "zip":
+            return None
+        return zipfile.ZipFile(staged, "r"), None
+    remote = HttpRangeFile(url)
+    reader = io.BufferedReader(remote, buffer_size=256 * 1024)
+    if detect_format(reader.peek(8)[:8]) != "zip":
+        return None
+    return zipfile.ZipFile(reader, "r"), remote
+
+
+def _unpack_release(url: Url, staging_path: str, dest: str) -> dict[str, str]:
+    """Unpack a tar release into dest and map its relative paths to the unpacked files."""
+    stream, archive_format = open_release(url, staging_path)
+    with stream:
+        relative_paths = unpack_tar(open_decompressed(stream, archive_format), dest)
+    return {relative_path: os.path.join(dest, relative_path) for relative_path in relative_paths}
+
+
+def _unpacked_matches(path: str, source: str) -> bool:
+    return os.path.isfile(path) and filecmp.cmp(source, path, shallow=False)
+
+
+def _file_matches(path: str, member: zipfile.ZipInfo) -> bool:
+    return (
+        os.path.isfile(path)
+        and os.path.getsize(path) == member.file_size
+        and crc32(path) == member.CRC
+    )
+
+
+def verify_install(options: Options, repair: bool = True) -> list[str]:
+    """Check the install against the published artifacts and fix what differs.
+
+    Installed files are hashed in parallel and compared with the CRCs of the
+    release zips' central directories, so only the directories are
+    downloaded. Tar releases have no such directory and are unpacked whole to
+    compare with. Mismatched files are then re-fetched member by member. Returns
+    the relative paths that did not match.
+    """
+    assert options.game_install_path is not None, "Game install path must be set."
+    game_install_path = os.path.abspath(options.game_install_path)
+    staging_path = staging_dir(options)
+
+    urls = [GAME_DOWNLOAD_URL] if options.auto_update_game else []
+    # The launcher leaves the mod loader alone otherwise, so it is not moved to the latest here either
+    if options.auto_update_game or options.auto_update_installer:
+        urls.append(MOD_LOADER_DOWNLOAD_URL)
+
+    tempfile_dir = tempfile.TemporaryDirectory()
+    releases: list[tuple[zipfile.ZipFile, HttpRangeFile | None]] = []
+    try:
+        # Later releases overwrite earlier ones on install, so they win here too
+        expected: dict[str, tuple[zipfile.ZipFile, HttpRangeFile | None, zipfile.ZipInfo]] = {}
+        unpacked: dict[str, str] = {}  # Files of tar releases, which must be downloaded whole
+        for i, url in enumerate(urls):
+            release = _open_release(url, staging_path)
+            if release is None:
+                for relative_path, source in _unpack_release(
+                    url, staging_path, os.path.join(tempfile_dir.name, str(i))
+                ).items():
+                    expected.pop(relative_path, None)
+                    unpacked[relative_path] = source
+                continue
+            releases.append(release)
+            zip_ref, remote = release
+            for member, relative_path in release_members(zip_ref):
+                unpacked.pop(relative_path, None)
+                expected[relative_path] = (zip_ref, remote, member)
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            matches = executor.map(
+                lambda item: _file_matches(os.path.join(game_install_path, item[0]), item[1][2]),
+                expected.items(),
+            )
+            unpacked_matches = executor.map(
+                lambda item: _unpacked_matches(os.path.join(game_install_path, item[0]), item[1]),
+                unpacked.items(),
+            )
+            mismatched = [relative_path for relative_path, ok in zip(expected, matches) if not ok]
+            mismatched += [relative_path for relative_path, ok in zip(unpacked, unpacked_matches) if not ok]
+
+        sources: dict[str, str] = dict(unpacked)
+        checked_mods = 0
+        for mod_name in options.mod_list:
+            if mod_name not in AVAILABLE_MODS:
+                continue
+            checked_mods += 1
+            relative_path = os.path.join("Mods", f"{mod_name}.dll")
+            source = os.path.join(tempfile_dir.name, f"{mod_name}.dll")
+            fetch_artifact(AVAILABLE_MODS[mod_name], source, staging_path)
+            live = os.path.join(game_install_path, relative_path)
+            if not os.path.isfile(live) or not filecmp.cmp(source, live, shallow=False):
+                mismatched.append(relative_path)
+                sources[relative_path] = source
+
+        logging.info(
+            f"Verified {len(expected) + len(unpacked) + checked_mods} files, "
+            f"{len(mismatched)} mismatched."
+        )
+        for relative_path in mismatched:
+            logging.warning(f"Mismatched file: {relative_path}")
+
+        if repair and mismatched:
+            transaction = InstallTransaction(game_install_path)
+            try:
+                for relative_path in mismatched:
+                    if relative_path in sources:
+                        transaction.stage_file(sources[relative_path], relative_path)
+                        continue
+                    zip_ref, remote, member = expected[relative_path]
+                    if remote is not None:
+                        # Local header, data and some slack for its extra field in one request
+                        remote.preload(
+                            member.header_offset,
+                            member.header_offset + member.compress_size + 64 * 1024,
+                        )
+                    with zip_ref.open(member) as src, open(transaction.staged_path(relative_path), "wb") as dst:
+                        while chunk := src.read(1024 * 1024):
+                            dst.write(chunk)
+                transaction.commit()
+            finally:
+                transaction.discard()
+            logging.info(f"Repaired {len(mismatched)} files.")
+    finally:
+        tempfile_dir.cleanup()
+        for zip_ref, _ in releases:
+            zip_ref.close()
+    return mismatched
+
+
+__all__ = ["HttpRangeFile", "verify_install"]